@@ -19,65 +19,317 @@ The logger will create a new directory with the following structure:
 		datapaths.txt    # A copy of datapaths.txt from curr_dir
 		codepaths.txt    # A copy of codepaths.txt from curr_dir with relative paths to the copied code, so this folder can be re-run as is
 
+Helpers available to main.py:
+    logger.get_data_path(key)       # The absolute path for key from datapaths.txt, or None
+    logger.get_results_directory()  # Where to save results
+    logger.installed_packages()     # Sorted "name==version" list of installed packages, cached after the first call
+
 '''
 
 import os
 import sys
-import shutil
+import stat
+import atexit
+import selectors
 import subprocess
 import datetime
+import collections
+import functools
+import itertools
+import re
+import json
+import socket
+import http.client
 import importlib.metadata
+import concurrent.futures
+try:
+    import fcntl  # Only used to grow pipes on Linux
+except ImportError:
+    fcntl = None
 
 # Constants
 CURR_DIR = os.path.dirname(os.path.abspath(__file__))
-TIMESTAMP = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-EXP_DIR = CURR_DIR + f"_[{TIMESTAMP}]"
-CODE_DIR = os.path.join(EXP_DIR, "Code")
-RESULTS_DIR = os.path.join(EXP_DIR, "Results")
 DATA_PATHS = {}
+DATA_PATHS_LOADED = False
+COPY_BUFFER_SIZE = 1 << 20
+# terminal_output.txt is buffered in memory and flushed and fsynced once, when run_experiment's
+# script exits or, for log_terminal, when the interpreter exits
+TERMINAL_LOG_BUFFER_SIZE = 1 << 20
+COPY_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+EXTERNAL_CODE_SKIP = {"__pycache__", ".git", ".mypy_cache"}
+DOCKER_SOCKET = "/var/run/docker.sock"
+SCANDIR_MIN_PATHS = 8
+FADVISE_MIN_SIZE = 64 << 20
+
+# Timestamped experiment paths are resolved on first use, not at import
+@functools.cache
+def _timestamp():
+    return datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+
+@functools.cache
+def _exp_dir():
+    return CURR_DIR + f"_[{_timestamp()}]"
+
+@functools.cache
+def _code_dir():
+    return os.path.join(_exp_dir(), "Code")
+
+@functools.cache
+def _results_dir():
+    return os.path.join(_exp_dir(), "Results")
+
+_LAZY_CONSTANTS = {
+    "TIMESTAMP": _timestamp,
+    "EXP_DIR": _exp_dir,
+    "CODE_DIR": _code_dir,
+    "RESULTS_DIR": _results_dir,
+}
+
+# Keep logger.EXP_DIR etc. working for callers (PEP 562)
+def __getattr__(name):
+    if name in _LAZY_CONSTANTS:
+        return _LAZY_CONSTANTS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Copy the bytes of one file, trying copy_file_range, then sendfile, then a plain read/write loop
+def _fast_copy(src, dst):
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        src_stat = os.fstat(src_fd)
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        try:
+            size = src_stat.st_size
+            offset = 0
+
+            # Kernel-side copy, can reflink on btrfs/xfs or copy server-side on NFS
+            if hasattr(os, "copy_file_range"):
+                try:
+                    while offset < size:
+                        copied = os.copy_file_range(src_fd, dst_fd, size - offset)
+                        if copied == 0:
+                            break
+                        offset += copied
+                except OSError:
+                    pass
+
+            if offset < size and hasattr(os, "sendfile"):
+                try:
+                    while offset < size:
+                        sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                        if sent == 0:
+                            break
+                        offset += sent
+                except OSError:
+                    pass
+
+            # Copy whatever is left (or everything, if neither syscall is available)
+            os.lseek(src_fd, offset, os.SEEK_SET)
+            os.lseek(dst_fd, offset, os.SEEK_SET)
+            buffer = bytearray(COPY_BUFFER_SIZE)
+            view = memoryview(buffer)
+            with open(src_fd, "rb", buffering=0, closefd=False) as src_file, \
+                 open(dst_fd, "wb", buffering=0, closefd=False) as dst_file:
+                while read := src_file.readinto(buffer):
+                    written = 0
+                    while written < read:
+                        written += dst_file.write(view[written:read])
+
+            # Match shutil.copy2, which also copies the permission bits and timestamps
+            os.fchmod(dst_fd, stat.S_IMODE(src_stat.st_mode))
+            os.utime(dst_fd, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+
+            # Large files won't be read back soon, so don't let them crowd the page cache. The kernel
+            # can only drop clean pages, so the copy is written out before its pages are released.
+            if size >= FADVISE_MIN_SIZE and hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(src_fd, 0, 0, os.POSIX_FADV_DONTNEED)
+                os.fdatasync(dst_fd)
+                os.posix_fadvise(dst_fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+# Write byte chunks to path via a temporary file and a rename, so a killed run never leaves a half-written file.
+# The chunks go through one large buffer, so many small chunks still become few write() calls.
+def _atomic_write(path, chunks):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb", buffering=1 << 20) as f:
+        f.writelines(chunks)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    # Sync the directory so the rename itself is durable
+    dir_fd = os.open(os.path.dirname(path), os.O_DIRECTORY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+# Recreate the directories under src in dst and queue every file on the executor, ignoring names in skip.
+# Each (src, dst) directory pair is appended to directories so its timestamps can be restored afterwards.
+def _walk_tree(src, dst, executor, futures, skip, directories):
+    os.makedirs(dst, exist_ok=True)
+    directories.append((src, dst))
+    with os.scandir(src) as entries:
+        for entry in entries:
+            if entry.name in skip:
+                continue
+            # DirEntry answers from the directory listing, symlinks are the only entries that need a stat
+            dest_path = os.path.join(dst, entry.name)
+            if entry.is_file():
+                futures.append(executor.submit(_fast_copy, entry.path, dest_path))
+            elif entry.is_dir():
+                _walk_tree(entry.path, dest_path, executor, futures, skip, directories)
+
+# Copy a directory tree, copying files in parallel on a thread pool
+def _copy_tree(src, dst, skip=frozenset()):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=COPY_WORKERS) as executor:
+        futures = []
+        directories = []
+        _walk_tree(src, dst, executor, futures, skip, directories)
+        for future in futures:
+            future.result()  # Re-raise any copy error
+
+    # Like shutil.copytree, keep directory timestamps, set last since copying files into a directory changes them
+    for src_dir, dst_dir in directories:
+        src_stat = os.stat(src_dir)
+        os.utime(dst_dir, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
 
 # Ensure output directories exist
+def _create_experiment_directories():
+    os.makedirs(_exp_dir())
+    os.makedirs(_code_dir())
+    os.makedirs(_results_dir())
+
+# Copy all files from curr_dir to timestamped directory
+def _copy_source_tree():
+    _copy_tree(CURR_DIR, _exp_dir())
+
 def setup_experiment_directory():
-    os.makedirs(EXP_DIR)
-    os.makedirs(CODE_DIR)
-    os.makedirs(RESULTS_DIR)
+    _create_experiment_directories()
+    _copy_source_tree()
 
-    # Copy all files from curr_dir to timestamped directory
-    for item in os.listdir(CURR_DIR):
-        src_path = os.path.join(CURR_DIR, item)
-        dest_path = os.path.join(EXP_DIR, item)
+# Yield (name, version) for each installed distribution, reading them from .dist-info directory names where possible
+def _iter_name_version():
+    for dist in importlib.metadata.distributions():
+        path = getattr(dist, "_path", None)
+        name, version = "", ""
+        if path is not None and path.name.endswith(".dist-info"):
+            name, _, version = path.stem.rpartition("-")
+        if name and version:
+            yield name, version
+        else:
+            # .egg-info and other layouts don't encode the version reliably, so read METADATA.
+            # Either field can be missing (None), which would break sorting the pairs.
+            yield str(dist.metadata["Name"]), str(dist.version)
+
+# Installed (name, version) pairs, sorted as tuples before any formatting
+@functools.cache
+def _installed_name_versions():
+    return tuple(sorted(_iter_name_version()))
+
+# Formatted name==version strings, cached as a tuple so callers can't change what later callers see
+@functools.cache
+def _installed_package_lines():
+    return tuple(f"{name}=={version}" for name, version in _installed_name_versions())
+
+# Sorted name==version list of installed packages, cheap to call as often as main.py likes.
+# Each call returns a new list, so callers may modify it.
+def installed_packages():
+    return list(_installed_package_lines())
 
-        if os.path.isdir(src_path):
-            shutil.copytree(src_path, dest_path)        
-        elif os.path.isfile(src_path):
-            shutil.copy(src_path, dest_path)
+# HTTP connection to the Docker daemon over its unix socket
+class _DockerConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path=DOCKER_SOCKET):
+        super().__init__("localhost", timeout=5)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+# Find this container's id in /proc, returning None when this process isn't running in a container
+def _docker_container_id():
+    # cgroup v1 names the container in this process's own cgroup path
+    try:
+        with open("/proc/self/cgroup") as f:
+            for line in f:
+                match = re.search(r"docker[/-]([0-9a-f]{64})", line)
+                if match:
+                    return match.group(1)
+    except OSError:
+        pass
+
+    # Without that, only /.dockerenv says this is a container; a Docker host has /docker/containers/
+    # paths in its mountinfo too, one set per running container
+    if not os.path.exists("/.dockerenv"):
+        return None
+
+    # cgroup v2: Docker bind mounts the container's own /etc/hostname, /etc/hosts and /etc/resolv.conf
+    try:
+        with open("/proc/self/mountinfo") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) > 4 and fields[4] in ("/etc/hostname", "/etc/hosts", "/etc/resolv.conf"):
+                    match = re.search(r"/docker/containers/([0-9a-f]{64})/", fields[3])
+                    if match:
+                        return match.group(1)
+    except OSError:
+        pass
+
+    # Docker sets the hostname to the short container id by default
+    with open("/etc/hostname") as f:
+        return f.read().strip()
+
+# Ask the Docker daemon which image a container was started from
+def _docker_image(container_id):
+    connection = _DockerConnection()
+    try:
+        connection.request("GET", f"/containers/{container_id}/json")
+        response = connection.getresponse()
+        if response.status != 200:
+            raise RuntimeError(f"Docker API returned {response.status} for container {container_id}")
+        return json.load(response)["Config"]["Image"]
+    finally:
+        connection.close()
 
 # Capture Python version, installed modules, Docker image, Slurm job info, and node name
 def capture_environment_info():
     python_version = sys.version
     
-    installed_packages = sorted([f"{dist.metadata['Name']}=={dist.version}" for dist in importlib.metadata.distributions()])
+    packages = _installed_name_versions()
     slurm_job_id = os.getenv("SLURM_JOB_ID", "Not running under Slurm")
     node_name = os.getenv("SLURMD_NODENAME", os.uname().nodename)
     
-    # Try to get Docker image name
-    docker_image = "Unknown"
-    try:
-        container_id = subprocess.check_output("cat /etc/hostname", shell=True, stderr=subprocess.DEVNULL).decode().strip()
-        docker_image = subprocess.check_output(f"docker inspect --format='{{{{.Config.Image}}}}' {container_id}", shell=True).decode().strip()
-    except Exception:
-        docker_image = "Could not retrieve Docker image"
+    # Try to get Docker image name from the Docker daemon's socket, without starting any process
+    docker_image = "Could not retrieve Docker image"
+    if os.path.exists(DOCKER_SOCKET):
+        try:
+            container_id = _docker_container_id()
+            if container_id:
+                docker_image = _docker_image(container_id)
+        except Exception:
+            pass
     
-    with open(os.path.join(CODE_DIR, "environment.txt"), "w") as f:
-        f.write(f"Python Version:\n{python_version}\n\n")
-        f.write(f"Docker Image: {docker_image}\n")
-        f.write(f"Slurm Job ID: {slurm_job_id}\n")
-        f.write(f"Node Name: {node_name}\n\n")
-        f.write("Installed Packages:\n")
-        f.write("\n".join(installed_packages))
+    # Encode the header once and stream the package lines behind it into the write buffer
+    header = "\n".join((
+        "Python Version:",
+        python_version,
+        "",
+        f"Docker Image: {docker_image}",
+        f"Slurm Job ID: {slurm_job_id}",
+        f"Node Name: {node_name}",
+        "",
+        "Installed Packages:",
+        "",
+    )).encode("utf-8")
+    package_lines = (f"{name}=={version}\n".encode("utf-8") for name, version in packages)
+    _atomic_write(os.path.join(_code_dir(), "environment.txt"), itertools.chain((header,), package_lines))
 
-# Copy external code and update search path
-def copy_external_code():
+# Copy the code listed in codepaths.txt, returning the copies' paths relative to the experiment directory
+def _copy_external_code():
     codepaths_file = os.path.join(CURR_DIR, "codepaths.txt")
     new_codepaths = []
     
@@ -86,44 +338,98 @@ def copy_external_code():
             for line in f:
                 code_path = line.strip()
                 if os.path.exists(code_path):
-                    shutil.copytree(code_path, os.path.join(CODE_DIR, os.path.basename(code_path)), dirs_exist_ok=True)
-                    new_codepaths.append(os.path.relpath(os.path.join(CODE_DIR, os.path.basename(code_path)), EXP_DIR))
-    
-    # Update codepaths.txt with relative paths
-    with open(os.path.join(EXP_DIR, "codepaths.txt"), "w") as f:
-        f.writelines("\n".join(new_codepaths) + "\n")
+                    _copy_tree(code_path, os.path.join(_code_dir(), os.path.basename(code_path)), skip=EXTERNAL_CODE_SKIP)
+                    new_codepaths.append(os.path.relpath(os.path.join(_code_dir(), os.path.basename(code_path)), _exp_dir()))
+    return new_codepaths
+
+# Update codepaths.txt with relative paths and add the copied code to the search path
+def _register_external_code(new_codepaths):
+    _atomic_write(os.path.join(_exp_dir(), "codepaths.txt"), [("\n".join(new_codepaths) + "\n").encode("utf-8")])
 
     # Add new code directory to search path
-    sys.path.insert(0, CODE_DIR)
+    sys.path.insert(0, _code_dir())
+
+# Copy external code and update search path
+def copy_external_code():
+    _register_external_code(_copy_external_code())
+
+# Set up the experiment directory, running the independent I/O-bound steps concurrently
+def _prepare_experiment():
+    _create_experiment_directories()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        environment_future = executor.submit(capture_environment_info)
+        external_code_future = executor.submit(_copy_external_code)
+        source_tree_future = executor.submit(_copy_source_tree)
+        environment_future.result()
+        source_tree_future.result()
+        new_codepaths = external_code_future.result()
+
+    # Done on the main thread once the source tree copy can no longer overwrite codepaths.txt
+    _register_external_code(new_codepaths)
+
+# Return the subset of paths that exist. Parents holding many of the paths are listed once with
+# os.scandir instead of a stat per path; the rest, and unlistable parents (e.g. chmod 711), use os.path.exists.
+# Listings are only used on Linux: matching names exactly against a listing would report paths as missing
+# on case-insensitive filesystems (the default on macOS and Windows) whenever their case differs.
+def _existing_paths(paths):
+    wanted = collections.defaultdict(list)
+    existing = set()
+    for path in paths:
+        parent, name = os.path.split(os.path.abspath(path))
+        if path and name:
+            wanted[parent].append((name, path))
+        elif os.path.exists(path):  # The filesystem root has no name to look up in its parent
+            existing.add(path)
+
+    for parent, entries_wanted in wanted.items():
+        children = None
+        if sys.platform.startswith("linux") and len(entries_wanted) >= SCANDIR_MIN_PATHS:
+            try:
+                with os.scandir(parent) as entries:
+                    children = {entry.name: entry for entry in entries}
+            except OSError:
+                pass
+        if children is None:
+            existing.update(path for _, path in entries_wanted if os.path.exists(path))
+            continue
+        for name, path in entries_wanted:
+            entry = children.get(name)
+            # A listed symlink may dangle, so follow it the way os.path.exists does
+            if entry is not None and (not entry.is_symlink() or os.path.exists(path)):
+                existing.add(path)
+    return existing
 
 # Verify data paths and prepare arguments
 def load_data_paths():
-    global DATA_PATHS
+    global DATA_PATHS, DATA_PATHS_LOADED
+    DATA_PATHS_LOADED = True
     datapaths_file = os.path.join(CURR_DIR, "datapaths.txt")
     
     if os.path.exists(datapaths_file):
         with open(datapaths_file, "r") as f:
-            for line in f:
-                if "=" in line:
-                    key, path = line.strip().split("=", 1)
-                    if os.path.exists(path):
-                        DATA_PATHS[key] = os.path.abspath(path)
-                    else:
-                        print(f"Warning: Data path does not exist: {path}")
+            data = f.read()
 
-# Load data paths at module import
-load_data_paths()
+        pairs = [[part.strip() for part in line.split("=", 1)] for line in data.splitlines() if "=" in line]
+        existing = _existing_paths([path for _, path in pairs])
+        DATA_PATHS.update({key: os.path.abspath(path) for key, path in pairs if path in existing})
+
+        for _, path in pairs:
+            if path not in existing:
+                print(f"Warning: Data path does not exist: {path}")
 
 def get_data_path(key):
+    # Data paths are loaded on first lookup when start_experiment() hasn't loaded them yet
+    if not DATA_PATHS_LOADED:
+        load_data_paths()
     return DATA_PATHS.get(key, None)
 
 def get_results_directory():
-    return RESULTS_DIR
+    return _results_dir()
 
 # Run main.py with verified paths
 def run_experiment():
-    main_script_py = os.path.join(EXP_DIR, "main.py")
-    main_script_sh = os.path.join(EXP_DIR, "main.sh")
+    main_script_py = os.path.join(_exp_dir(), "main.py")
+    main_script_sh = os.path.join(_exp_dir(), "main.sh")
     
     if not os.path.exists(main_script_py) and not os.path.exists(main_script_sh):
         raise FileNotFoundError("Neither main.py nor main.sh found in experiment directory, please provide one.")
@@ -132,21 +438,48 @@ def run_experiment():
         print("WARNING: Both main.py and main.sh found in experiment directory. Running main.sh.")
     
     if os.path.exists(main_script_sh):
-        script_path = main_script_sh
+        command = ["sh", main_script_sh]
     else:
-        script_path = main_script_py
+        command = ["python3", main_script_py]
     
-    with open(os.path.join(RESULTS_DIR, "terminal_output.txt"), "w") as log_file:
-        if script_path.endswith(".sh"):
-            process = subprocess.Popen(["sh", script_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-        else:
-            process = subprocess.Popen(["python3", script_path], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    # main.py runs in its own process rather than in-process with runpy: this process then logs output written
+    # straight to fds 1/2 (child processes, C extensions, faulthandler) and keeps the log if the script crashes
+    with open(os.path.join(_results_dir(), "terminal_output.txt"), "wb", buffering=TERMINAL_LOG_BUFFER_SIZE) as log_file:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         
-        for line in process.stdout:
-            print(line, end='')  # Print to terminal
-            log_file.write(line)  # Write to file
-        process.stdout.close()
-        process.wait()
+        # Echo each pipe to its own terminal stream
+        terminal_streams = {process.stdout.fileno(): sys.stdout, process.stderr.fileno(): sys.stderr}
+
+        # Grow the pipes so the child blocks less often on a slow reader (Linux only)
+        if fcntl is not None and hasattr(fcntl, "F_SETPIPE_SZ"):
+            for pipe_fd in terminal_streams:
+                try:
+                    fcntl.fcntl(pipe_fd, fcntl.F_SETPIPE_SZ, 1 << 20)
+                except OSError:
+                    pass
+
+        # Drain whichever pipe is ready and pass raw bytes straight through, the log file is only flushed at the end
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            with selectors.DefaultSelector() as selector:
+                for pipe_fd, stream in terminal_streams.items():
+                    selector.register(pipe_fd, selectors.EVENT_READ, stream.buffer)
+                while selector.get_map():
+                    for key, _ in selector.select():
+                        chunk = os.read(key.fd, 1 << 16)
+                        if not chunk:
+                            selector.unregister(key.fd)
+                            continue
+                        key.data.write(chunk)  # Print to terminal
+                        key.data.flush()
+                        log_file.write(chunk)  # Write to file
+            process.stdout.close()
+            process.stderr.close()
+            process.wait()
+        finally:
+            log_file.flush()
+            os.fsync(log_file.fileno())
 
 # Create a new experiment folder structure
 def initialize_experiment_folder():
@@ -166,28 +499,62 @@ def initialize_experiment_folder():
 # in any file and it will do the same thing as running it from terminal.
 # ======================================================================================
 class Tee:
-    def __init__(self, *files):
+    # Writes text to several binary streams, encoding it once. Streams in text_files are given
+    # the text as is, and streams in flush_on_newline are flushed whenever a newline or carriage
+    # return is written, like a line-buffered terminal.
+    def __init__(self, *files, text_files=(), flush_on_newline=()):
         self.files = files
+        self.text_files = text_files
+        self.flush_on_newline = flush_on_newline
 
     def write(self, obj):
+        if not isinstance(obj, str):
+            raise TypeError(f"write() argument must be str, not {type(obj).__name__}")
+        data = obj.encode("utf-8", "replace")
         for f in self.files:
-            f.write(obj)
-            f.flush()  # Ensure the output is written immediately
+            f.write(obj if f in self.text_files else data)
+        # A line-buffered TextIOWrapper flushes on carriage returns too, which progress bars rely on
+        if b"\n" in data or b"\r" in data:
+            for f in self.flush_on_newline:
+                f.flush()
+        return len(obj)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
 
     def flush(self):
         for f in self.files:
             f.flush()
 
+# Restore the original streams and flush the terminal log to disk once, at exit
+def _close_terminal_log(log_file, stdout, stderr):
+    sys.stdout.flush()
+    sys.stderr.flush()
+    sys.stdout = stdout
+    sys.stderr = stderr
+    log_file.flush()
+    os.fsync(log_file.fileno())
+    log_file.close()
+
+# Tee a text stream's underlying binary buffer into the log, keeping its line buffering on the terminal side
+def _tee_stream(stream, log_file):
+    stream.flush()
+    terminal = getattr(stream, "buffer", None)
+    if terminal is None:
+        # Jupyter, IDE consoles and other replaced streams only take text
+        return Tee(stream, log_file, text_files=(stream,))
+    return Tee(terminal, log_file, flush_on_newline=(terminal,) if getattr(stream, "line_buffering", False) else ())
+
 def log_terminal():
-    # Log terminal output to a file
-    with open(os.path.join(RESULTS_DIR, "terminal_output.txt"), "w") as log_file:
-        sys.stdout = Tee(sys.stdout, log_file)
-        sys.stderr = Tee(sys.stderr, log_file)
+    # Log terminal output to a file, kept open until the interpreter exits
+    log_file = open(os.path.join(_results_dir(), "terminal_output.txt"), "wb", buffering=TERMINAL_LOG_BUFFER_SIZE)
+    atexit.register(_close_terminal_log, log_file, sys.stdout, sys.stderr)
+    sys.stdout = _tee_stream(sys.stdout, log_file)
+    sys.stderr = _tee_stream(sys.stderr, log_file)
 
 def start_experiment():
-    setup_experiment_directory()
-    capture_environment_info()
-    copy_external_code()
+    _prepare_experiment()
     load_data_paths()
     log_terminal()
 
@@ -200,7 +567,5 @@ if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "--initialize":
         initialize_experiment_folder()
     else:
-        setup_experiment_directory()
-        capture_environment_info()
-        copy_external_code()
+        _prepare_experiment()
         run_experiment()